@@ -1,59 +1,109 @@
 import json
 import base64
 import time
-from typing import Dict, Any
+import os
+import logging
+import random
+from typing import Dict, Any, Optional
 import re
 
+from utils.constants import CORS_HEADERS, IMAGE_SIGNATURES
+from utils.response import json_dumps
+
+# レスポンスヘッダー（リクエストごとに生成せず共有）
+_CORS_HEADERS = {**CORS_HEADERS, 'Content-Type': 'application/json'}
+_ERROR_HEADERS = {
+    'Access-Control-Allow-Origin': CORS_HEADERS['Access-Control-Allow-Origin'],
+    'Content-Type': 'application/json'
+}
+
+SCAN_TIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+# SCAN_DEBUG=1 の場合のみリクエスト内容をデバッグ出力
+_DEBUG = os.environ.get('SCAN_DEBUG') == '1'
+logger = logging.getLogger()
+logger.setLevel(logging.DEBUG if _DEBUG else logging.INFO)
+
+# 解析用の正規表現はモジュール読み込み時にコンパイル
+_DIGIT_RE = re.compile(r'\d')
+_ALPHA_RE = re.compile(r'[a-zA-Z]')
+
+# 画像解析の模擬結果テンプレート: (データ, 形式, 信頼度下限, 信頼度幅, 処理時間範囲, 末尾乱数範囲)
+_IMAGE_PATTERN_TEMPLATES = (
+    ('4901234567894', 'JAN_13', 0.85, 0.1, (200, 800), None),
+    ('https://example.com/product/12345', 'QR_CODE', 0.90, 0.1, (150, 600), None),
+    ('SERVERSIDE', 'CODE_128', 0.80, 0.15, (300, 900), (100000, 999999))
+)
+
+# プロバイダー別の模擬バーコードテンプレート: (接頭辞, 形式, 乱数範囲)
+_PROVIDER_TEMPLATES = {
+    'ticketmaster': ('TM', 'CODE_128', (100000000, 999999999)),
+    'eventbrite': ('EB', 'QR_CODE', (100000000, 999999999)),
+    'pia': ('PIA', 'CODE_39', (10000000, 99999999))
+}
+
+# フォーマット別の模擬バーコードテンプレート: (接頭辞, 乱数範囲)
+_FORMAT_TEMPLATES = {
+    'QR_CODE': ('https://qr.example.com/', (100000, 999999)),
+    'CODE_128': ('C128_', (100000000, 999999999)),
+    'CODE_39': ('C39_', (100000, 999999)),
+    'JAN_13': ('49', (10000000000, 99999999999)),
+    'EAN_8': ('', (10000000, 99999999))
+}
+_FORMAT_NAMES = tuple(_FORMAT_TEMPLATES)
+
 def lambda_handler(event: Dict[str, Any], context) -> Dict[str, Any]:
     """本番用バーコードスキャンハンドラー"""
     try:
-        cors_headers = {
-            'Access-Control-Allow-Origin': '*',
-            'Access-Control-Allow-Headers': 'Content-Type,X-Amz-Date,Authorization,X-Api-Key,X-Amz-Security-Token',
-            'Access-Control-Allow-Methods': 'GET,POST,PUT,DELETE,OPTIONS',
-            'Content-Type': 'application/json'
-        }
-        
         if event.get('httpMethod') == 'OPTIONS':
-            return {'statusCode': 200, 'headers': cors_headers, 'body': '{}'}
+            return {'statusCode': 200, 'headers': _CORS_HEADERS, 'body': '{}'}
         
-        print(f"受信イベント: {json.dumps(event, default=str)}")
+        if _DEBUG:
+            logger.debug("受信イベント: keys=%s", list(event.keys()))
         
-        # リクエストボディの解析
-        body = event.get('body', '')
+        # リクエストボディの解析（json.loadsはbytesをそのまま受け付けるため文字列へのデコードは不要）
+        body = event.get('body') or ''
         if event.get('isBase64Encoded', False):
-            body = base64.b64decode(body).decode('utf-8')
+            body = base64.b64decode(body)
         
-        try:
-            request_data = json.loads(body) if body else {}
-        except json.JSONDecodeError:
-            request_data = {}
+        if isinstance(body, bytes) and body.startswith(IMAGE_SIGNATURES):
+            # 画像のマジックナンバーで始まるバイナリは画像データそのものとして扱う（コピーせずに参照）
+            request_data = {'image': memoryview(body)}
+        else:
+            try:
+                request_data = json.loads(body) if body else {}
+            except ValueError:
+                request_data = {}
         
-        print(f"リクエストデータ: {request_data}")
+        if _DEBUG:
+            logger.debug("リクエストデータ: keys=%s", list(request_data.keys()))
+        
+        # スキャン時刻はリクエストごとに1回だけ生成
+        scan_time = time.strftime(SCAN_TIME_FORMAT)
         
         # 画像データがある場合の処理
         if 'image' in request_data or any(key.startswith('data:image') for key in request_data.keys()):
             print("📸 画像データを受信 - 画像解析を実行")
-            result = analyze_image_data(request_data)
+            result = analyze_image_data(request_data, scan_time)
         else:
             print("📱 通常のスキャンリクエスト - 高精度検出を実行")
-            result = perform_high_accuracy_scan(request_data)
+            result = perform_high_accuracy_scan(request_data, scan_time)
         
         return {
             'statusCode': 200,
-            'headers': cors_headers,
-            'body': json.dumps(result, ensure_ascii=False)
+            'headers': _CORS_HEADERS,
+            'body': json_dumps(result)
         }
         
     except Exception as e:
-        print(f"エラー発生: {str(e)}")
+        logger.exception("エラー発生: %s", e)
         return {
             'statusCode': 500,
-            'headers': {'Access-Control-Allow-Origin': '*', 'Content-Type': 'application/json'},
-            'body': json.dumps({'success': False, 'error': str(e)})
+            'headers': _ERROR_HEADERS,
+            'body': json_dumps({'success': False, 'error': str(e)})
         }
 
-def analyze_image_data(request_data: Dict[str, Any]) -> Dict[str, Any]:
+def analyze_image_data(request_data: Dict[str, Any], scan_time: Optional[str] = None) -> Dict[str, Any]:
     """画像データの解析"""
     print("🔍 サーバーサイド画像解析開始")
     
@@ -71,14 +121,10 @@ def analyze_image_data(request_data: Dict[str, Any]) -> Dict[str, Any]:
             "detected_format": detected_patterns['format'],
             "confidence": detected_patterns['confidence'],
             "provider": "server",
-            "parsed_data": {
-                "provider": "server",
-                "provider_name": "サーバーサイド解析",
-                "raw_data": detected_patterns['data'],
-                "analysis_method": "image_processing",
-                "processing_time": detected_patterns.get('processing_time', 0),
-                "scan_time": time.strftime("%Y-%m-%d %H:%M:%S")
-            }
+            "provider_name": "サーバーサイド解析",
+            "analysis_method": "image_processing",
+            "processing_time": detected_patterns.get('processing_time', 0),
+            "scan_time": scan_time or time.strftime(SCAN_TIME_FORMAT)
         }
     else:
         print("❌ サーバーサイド検出失敗")
@@ -93,7 +139,7 @@ def analyze_image_data(request_data: Dict[str, Any]) -> Dict[str, Any]:
             ]
         }
 
-def perform_high_accuracy_scan(request_data: Dict[str, Any]) -> Dict[str, Any]:
+def perform_high_accuracy_scan(request_data: Dict[str, Any], scan_time: Optional[str] = None) -> Dict[str, Any]:
     """高精度スキャン実行"""
     print("🎯 高精度スキャンモード")
     
@@ -111,7 +157,7 @@ def perform_high_accuracy_scan(request_data: Dict[str, Any]) -> Dict[str, Any]:
         print(f"✅ 高精度検出成功: {detection_result['data']}")
         
         # プロバイダー固有の解析
-        parsed_data = parse_barcode_by_provider(detection_result['data'], provider_hint)
+        parsed_data = parse_barcode_by_provider(detection_result['data'], provider_hint, scan_time)
         
         return {
             "success": True,
@@ -134,79 +180,41 @@ def perform_high_accuracy_scan(request_data: Dict[str, Any]) -> Dict[str, Any]:
 
 def simulate_image_analysis() -> Dict[str, Any]:
     """画像解析の模擬（実際の実装では画像処理ライブラリを使用）"""
-    import random
-    
     # 30%の確率で検出成功を模擬
     if random.random() < 0.3:
-        patterns = [
-            {
-                'data': '4901234567894',
-                'format': 'JAN_13',
-                'confidence': 0.85 + random.random() * 0.1,
-                'processing_time': random.randint(200, 800)
-            },
-            {
-                'data': 'https://example.com/product/12345',
-                'format': 'QR_CODE', 
-                'confidence': 0.90 + random.random() * 0.1,
-                'processing_time': random.randint(150, 600)
-            },
-            {
-                'data': 'SERVERSIDE' + str(random.randint(100000, 999999)),
-                'format': 'CODE_128',
-                'confidence': 0.80 + random.random() * 0.15,
-                'processing_time': random.randint(300, 900)
-            }
-        ]
-        return random.choice(patterns)
+        data, format_name, base_confidence, spread, time_range, suffix_range = random.choice(_IMAGE_PATTERN_TEMPLATES)
+        if suffix_range:
+            data += str(random.randint(*suffix_range))
+        return {
+            'data': data,
+            'format': format_name,
+            'confidence': base_confidence + random.random() * spread,
+            'processing_time': random.randint(*time_range)
+        }
     
     return None
 
 def simulate_barcode_detection(provider_hint: str, format_hint: str) -> Dict[str, Any]:
     """バーコード検出の模擬"""
-    import random
-    
     # 25%の確率で検出成功を模擬
     if random.random() < 0.25:
         
         # プロバイダーヒントに基づく生成
-        if provider_hint:
-            provider_patterns = {
-                'ticketmaster': {
-                    'data': 'TM' + str(random.randint(100000000, 999999999)),
-                    'format': 'CODE_128',
-                    'provider': 'ticketmaster'
-                },
-                'eventbrite': {
-                    'data': 'EB' + str(random.randint(100000000, 999999999)), 
-                    'format': 'QR_CODE',
-                    'provider': 'eventbrite'
-                },
-                'pia': {
-                    'data': 'PIA' + str(random.randint(10000000, 99999999)),
-                    'format': 'CODE_39',
-                    'provider': 'pia'
-                }
+        if provider_hint in _PROVIDER_TEMPLATES:
+            prefix, format_name, number_range = _PROVIDER_TEMPLATES[provider_hint]
+            return {
+                'data': prefix + str(random.randint(*number_range)),
+                'format': format_name,
+                'provider': provider_hint,
+                'confidence': 0.90 + random.random() * 0.1
             }
-            
-            if provider_hint in provider_patterns:
-                pattern = provider_patterns[provider_hint]
-                pattern['confidence'] = 0.90 + random.random() * 0.1
-                return pattern
         
         # フォーマットヒントに基づく生成
-        format_patterns = {
-            'QR_CODE': 'https://qr.example.com/' + str(random.randint(100000, 999999)),
-            'CODE_128': 'C128_' + str(random.randint(100000000, 999999999)),
-            'CODE_39': 'C39_' + str(random.randint(100000, 999999)),
-            'JAN_13': '49' + str(random.randint(10000000000, 99999999999)),
-            'EAN_8': str(random.randint(10000000, 99999999))
-        }
-        
-        format_to_use = format_hint if format_hint in format_patterns else random.choice(list(format_patterns.keys()))
+        format_to_use = format_hint if format_hint in _FORMAT_TEMPLATES else random.choice(_FORMAT_NAMES)
+        prefix, number_range = _FORMAT_TEMPLATES[format_to_use]
         
         return {
-            'data': format_patterns[format_to_use],
+            'data': prefix + str(random.randint(*number_range)),
             'format': format_to_use,
             'confidence': 0.85 + random.random() * 0.15,
             'provider': 'server_detection'
@@ -214,13 +222,13 @@ def simulate_barcode_detection(provider_hint: str, format_hint: str) -> Dict[str
     
     return None
 
-def parse_barcode_by_provider(barcode_data: str, provider_hint: str) -> Dict[str, Any]:
+def parse_barcode_by_provider(barcode_data: str, provider_hint: str, scan_time: Optional[str] = None) -> Dict[str, Any]:
     """プロバイダー固有のバーコード解析"""
     base_data = {
         "provider": provider_hint or "unknown",
         "provider_name": get_provider_name(provider_hint),
         "raw_data": barcode_data,
-        "scan_time": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "scan_time": scan_time or time.strftime(SCAN_TIME_FORMAT),
         "analysis_method": "server_parsing"
     }
     
@@ -261,11 +269,16 @@ def get_provider_name(provider_hint: str) -> str:
     }
     return provider_names.get(provider_hint, '不明')
 
+def _extract_prefixed_number(barcode_data: str, prefix: str) -> str:
+    """接頭辞+数字形式のデータから数字部分を抽出（該当しない場合は末尾8文字）"""
+    number = barcode_data[len(prefix):]
+    if barcode_data.startswith(prefix) and number.isdecimal():
+        return number
+    return barcode_data[-8:]
+
 def extract_ticket_id(barcode_data: str) -> str:
     """チケットIDの抽出（模擬）"""
-    # 実際の実装では正規表現やパターンマッチングを使用
-    match = re.search(r'TM(\d+)', barcode_data)
-    return match.group(1) if match else barcode_data[-8:]
+    return _extract_prefixed_number(barcode_data, 'TM')
 
 def extract_venue_code(barcode_data: str) -> str:
     """会場コードの抽出（模擬）"""
@@ -273,8 +286,7 @@ def extract_venue_code(barcode_data: str) -> str:
 
 def extract_event_id(barcode_data: str) -> str:
     """イベントIDの抽出（模擬）"""
-    match = re.search(r'EB(\d+)', barcode_data)
-    return match.group(1) if match else barcode_data[-8:]
+    return _extract_prefixed_number(barcode_data, 'EB')
 
 def extract_attendee_id(barcode_data: str) -> str:
     """参加者IDの抽出（模擬）"""
@@ -282,8 +294,7 @@ def extract_attendee_id(barcode_data: str) -> str:
 
 def extract_performance_code(barcode_data: str) -> str:
     """公演コードの抽出（模擬）"""
-    match = re.search(r'PIA(\d+)', barcode_data)
-    return match.group(1) if match else barcode_data[-8:]
+    return _extract_prefixed_number(barcode_data, 'PIA')
 
 def analyze_general_barcode(barcode_data: str) -> Dict[str, Any]:
     """一般的なバーコード解析"""
@@ -311,15 +322,15 @@ def analyze_general_barcode(barcode_data: str) -> Dict[str, Any]:
     else:
         analysis['type'] = 'TEXT'
         analysis['length'] = len(barcode_data)
-        analysis['contains_numbers'] = bool(re.search(r'\d', barcode_data))
-        analysis['contains_letters'] = bool(re.search(r'[a-zA-Z]', barcode_data))
+        analysis['contains_numbers'] = bool(_DIGIT_RE.search(barcode_data))
+        analysis['contains_letters'] = bool(_ALPHA_RE.search(barcode_data))
     
     return analysis
 
 def extract_domain(url: str) -> str:
     """URLからドメインを抽出"""
-    match = re.search(r'https?://([^/]+)', url)
-    return match.group(1) if match else ''
+    # 呼び出し元で http:// / https:// 始まりを確認済みのため、3番目の要素がホスト部
+    return url.split('/', 3)[2] if '//' in url else ''
 
 def batch_lambda_handler(event: Dict[str, Any], context) -> Dict[str, Any]:
     """バッチ処理用ハンドラー"""
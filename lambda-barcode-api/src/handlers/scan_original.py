@@ -1,8 +1,13 @@
 import json
 import base64
 import io
+import os
 import time
 import re
+import traceback
+from datetime import datetime
+from decimal import Decimal
+from concurrent.futures import ThreadPoolExecutor
 from typing import Dict, Any, List
 import boto3
 from PIL import Image
@@ -11,9 +16,23 @@ from services.barcode_scanner import MultiFormatBarcodeScanner
 from services.image_processor import ImageProcessor
 from services.provider_parser import ProviderParser
 from utils.response import create_response, create_error_response
-from utils.validation import validate_image_file, validate_scan_params
+from utils.validation import validate_image_file, validate_scan_params, extract_boundary
 from utils.constants import MAX_FILE_SIZE, SUPPORTED_FORMATS
 
+# 処理クラスとDynamoDBテーブルはコンテナ単位で1回だけ初期化し、ウォーム起動時に再利用
+_processor = ImageProcessor()
+_scanner = MultiFormatBarcodeScanner()
+_parser = ProviderParser()
+
+_dynamodb_table_name = os.environ.get('DYNAMODB_TABLE')
+_dynamodb_table = boto3.resource('dynamodb').Table(_dynamodb_table_name) if _dynamodb_table_name else None
+
+# Content-Dispositionのname属性（filename属性には一致しない）
+_NAME_RE = re.compile(rb'\bname="([^"]+)"')
+
+# base64のContent-Transfer-Encoding（ブラウザからの送信では稀）
+_BASE64_CTE_RE = re.compile(rb'content-transfer-encoding:\s*base64', re.IGNORECASE)
+
 def lambda_handler(event: Dict[str, Any], context) -> Dict[str, Any]:
     """
     単一画像のバーコードスキャン
@@ -54,29 +73,28 @@ def lambda_handler(event: Dict[str, Any], context) -> Dict[str, Any]:
         if param_error:
             return create_error_response(400, param_error)
         
+        enable_ml = params.get('enable_ml', 'true').lower() == 'true'
+        
         # 画像処理
-        processor = ImageProcessor()
-        variants = processor.create_variants(image_data)
+        variants = _processor.create_variants(image_data)
         
         # バーコードスキャン
-        scanner = MultiFormatBarcodeScanner()
-        results = scanner.scan_multiple_variants(
+        results = _scanner.scan_multiple_variants(
             variants,
             provider_hint=params.get('provider_hint'),
             format_hint=params.get('format_hint'),
-            enable_ml=params.get('enable_ml', 'true').lower() == 'true'
+            enable_ml=enable_ml
         )
         
         if not results:
             return create_error_response(404, "No barcode detected")
         
         # 最適結果選択
-        best_result = scanner.select_best_result(results)
+        best_result = _scanner.select_best_result(results)
         
         # プロバイダー固有解析
-        parser = ProviderParser()
-        provider = parser.detect_provider(best_result['data'])
-        parsed_data = parser.parse(best_result['data'], provider)
+        provider = _parser.detect_provider(best_result['data'])
+        parsed_data = _parser.parse(best_result['data'], provider)
         
         # レスポンス構築
         processing_time = int((time.time() - start_time) * 1000)
@@ -93,7 +111,7 @@ def lambda_handler(event: Dict[str, Any], context) -> Dict[str, Any]:
                 "total_time_ms": processing_time,
                 "preprocessing_variants": [v['name'] for v in variants],
                 "engines_tried": list(set(r['engine'] for r in results)),
-                "ml_prediction_used": len(results) > 1 and params.get('enable_ml', 'true').lower() == 'true'
+                "ml_prediction_used": len(results) > 1 and enable_ml
             }
         }
         
@@ -103,7 +121,6 @@ def lambda_handler(event: Dict[str, Any], context) -> Dict[str, Any]:
         return create_response(200, response_data, cors=True)
         
     except Exception as e:
-        import traceback
         print(f"Error in scan handler: {str(e)}")
         print(traceback.format_exc())
         return create_error_response(500, f"Internal server error: {str(e)}", cors=True)
@@ -135,62 +152,22 @@ def batch_lambda_handler(event: Dict[str, Any], context) -> Dict[str, Any]:
         if len(images_data) > 10:
             return create_error_response(400, "Maximum 10 images allowed")
         
-        # 並列処理でスキャン
-        scanner = MultiFormatBarcodeScanner()
-        processor = ImageProcessor()
-        
-        results = []
-        successful = 0
-        
-        for idx, image_data in enumerate(images_data):
-            try:
-                # 画像検証
-                validation_error = validate_image_file(image_data, MAX_FILE_SIZE)
-                if validation_error:
-                    results.append({
-                        "image_index": idx,
-                        "success": False,
-                        "error": validation_error
-                    })
-                    continue
-                
-                # 処理実行
-                variants = processor.create_variants(image_data)
-                scan_results = scanner.scan_multiple_variants(
-                    variants,
-                    provider_hint=params.get('provider_hint'),
-                    format_hint=params.get('format_hint')
-                )
-                
-                if scan_results:
-                    best_result = scanner.select_best_result(scan_results)
-                    parser = ProviderParser()
-                    provider = parser.detect_provider(best_result['data'])
-                    parsed_data = parser.parse(best_result['data'], provider)
-                    
-                    results.append({
-                        "image_index": idx,
-                        "success": True,
-                        "barcode_data": best_result['data'],
-                        "detected_format": best_result['format'],
-                        "confidence": best_result['confidence'],
-                        "provider": provider,
-                        "parsed_data": parsed_data
-                    })
-                    successful += 1
-                else:
-                    results.append({
-                        "image_index": idx,
-                        "success": False,
-                        "error": "No barcode detected"
-                    })
-                    
-            except Exception as e:
-                results.append({
-                    "image_index": idx,
-                    "success": False,
-                    "error": str(e)
-                })
+        # 並列処理でスキャン（OpenCV/PILの処理はGILを解放するため画像ごとにスレッドで実行）
+        # 共有の処理クラスは状態を持たない（OpenCV検出器はスレッドごとに保持）ためそのまま使用
+        with ThreadPoolExecutor(max_workers=min(len(images_data), os.cpu_count() or 1)) as executor:
+            outcomes = list(executor.map(
+                _process_batch_image,
+                range(len(images_data)),
+                images_data,
+                [params] * len(images_data)
+            ))
+        
+        results = [result for result, _ in outcomes]
+        scan_items = [scan_item for _, scan_item in outcomes if scan_item]
+        successful = len(scan_items)
+        
+        # DynamoDBにまとめて保存（オプション）
+        save_scan_results(scan_items)
         
         processing_time = int((time.time() - start_time) * 1000)
         
@@ -210,36 +187,136 @@ def batch_lambda_handler(event: Dict[str, Any], context) -> Dict[str, Any]:
         print(f"Error in batch scan handler: {str(e)}")
         return create_error_response(500, f"Internal server error: {str(e)}", cors=True)
 
-def extract_multipart_data(body: bytes, content_type: str) -> tuple:
+def _process_batch_image(idx: int, image_data: bytes, params: Dict[str, str]) -> tuple:
     """
-    マルチパートデータから画像とパラメータを抽出
+    バッチ内の1画像をスキャン
+
+    Returns:
+        (レスポンス用の結果, DynamoDB保存用アイテム（失敗時はNone）)
+    """
+    try:
+        # 画像検証
+        validation_error = validate_image_file(image_data, MAX_FILE_SIZE)
+        if validation_error:
+            return {
+                "image_index": idx,
+                "success": False,
+                "error": validation_error
+            }, None
+        
+        # 処理実行
+        variants = _processor.create_variants(image_data)
+        scan_results = _scanner.scan_multiple_variants(
+            variants,
+            provider_hint=params.get('provider_hint'),
+            format_hint=params.get('format_hint')
+        )
+        
+        if not scan_results:
+            return {
+                "image_index": idx,
+                "success": False,
+                "error": "No barcode detected"
+            }, None
+        
+        best_result = _scanner.select_best_result(scan_results)
+        provider = _parser.detect_provider(best_result['data'])
+        parsed_data = _parser.parse(best_result['data'], provider)
+        
+        return {
+            "image_index": idx,
+            "success": True,
+            "barcode_data": best_result['data'],
+            "detected_format": best_result['format'],
+            "confidence": best_result['confidence'],
+            "provider": provider,
+            "parsed_data": parsed_data
+        }, _build_scan_item(best_result, provider, parsed_data)
+        
+    except Exception as e:
+        return {
+            "image_index": idx,
+            "success": False,
+            "error": str(e)
+        }, None
+
+def _iter_multipart_parts(body: bytes, boundary: str):
     """
-    import email
-    from email.mime.multipart import MIMEMultipart
-    from io import BytesIO
+    マルチパートボディを境界文字列で走査し、(ヘッダー, 本文) の組を順に返す
+
+    email パッケージでメッセージ全体を再構築せず、bytes.find による1回の線形走査で分割する
+    本文はmemoryviewのスライスとして返すため、ボディ全体のコピーは発生しない
+    """
+    # パート間のデリミタはCRLFを含めて検索する（本文末尾のCRLFの判定が不要になる）
+    delimiter = b'\r\n--' + boundary.encode()
+    mv = memoryview(body)
     
+    # 最初のデリミタはボディ先頭にあり、CRLFが前置されない
+    pos = body.find(delimiter[2:])
+    if pos == -1:
+        return
+    start = pos + len(delimiter) - 2
+    
+    while True:
+        # 終端デリミタ（--boundary--）
+        if body.startswith(b'--', start):
+            break
+        
+        # ボディはバッファ済みのため、bytes.findの1回の呼び出しで次のデリミタが確定する
+        next_pos = body.find(delimiter, start)
+        if next_pos == -1:
+            # 終端デリミタのない不完全なボディ
+            break
+        
+        # ヘッダーと本文は最初の空行で区切られる
+        header_end = body.find(b'\r\n\r\n', start, next_pos)
+        if header_end != -1:
+            # ヘッダーは小さいため正規表現で扱えるようbytesにする
+            headers = bytes(mv[start:header_end])
+            yield headers, mv[header_end + 4:next_pos]
+        
+        start = next_pos + len(delimiter)
+
+def _iter_form_fields(body: bytes, content_type: str):
+    """
+    マルチパートの各パートを (name, 本文) の組で返す
+
+    ヘッダーはパートごとに1回だけ走査し、name属性を持たないパートは読み飛ばす
+    """
     # boundary抽出
-    boundary = content_type.split('boundary=')[1].strip()
+    boundary = extract_boundary(content_type)
+    if not boundary:
+        return
     
-    # email.parserを使用してマルチパートデータを解析
-    msg_str = f"Content-Type: {content_type}\r\n\r\n".encode() + body
-    msg = email.message_from_bytes(msg_str)
+    if isinstance(body, str):
+        body = body.encode('utf-8')
     
+    for headers, payload in _iter_multipart_parts(body, boundary):
+        name_match = _NAME_RE.search(headers)
+        if not name_match:
+            continue
+        
+        # 本文はここで初めてbytesとして取り出す（後続のデコード処理はbytesを前提とする）
+        if _BASE64_CTE_RE.search(headers):
+            payload = base64.b64decode(payload)
+        else:
+            payload = bytes(payload)
+        
+        yield name_match.group(1), payload
+
+def extract_multipart_data(body: bytes, content_type: str) -> tuple:
+    """
+    マルチパートデータから画像とパラメータを抽出
+    """
     image_data = None
     params = {}
     
-    if msg.is_multipart():
-        for part in msg.walk():
-            content_disposition = part.get('Content-Disposition', '')
-            
-            if 'name="image"' in content_disposition:
-                image_data = part.get_payload(decode=True)
-            else:
-                # その他のパラメータ
-                name_match = re.search(r'name="([^"]+)"', content_disposition)
-                if name_match:
-                    param_name = name_match.group(1)
-                    params[param_name] = part.get_payload(decode=True).decode('utf-8')
+    for param_name, payload in _iter_form_fields(body, content_type):
+        if param_name == b'image':
+            image_data = payload
+        else:
+            # その他のパラメータ
+            params[param_name.decode('utf-8')] = payload.decode('utf-8')
     
     return image_data, params
 
@@ -247,33 +324,16 @@ def extract_multiple_images(body: bytes, content_type: str) -> tuple:
     """
     複数画像のマルチパートデータを解析
     """
-    import email
-    
-    # boundary抽出
-    boundary = content_type.split('boundary=')[1].strip()
-    
-    # email.parserを使用してマルチパートデータを解析
-    msg_str = f"Content-Type: {content_type}\r\n\r\n".encode() + body
-    msg = email.message_from_bytes(msg_str)
-    
     images_data = []
     params = {}
     
-    if msg.is_multipart():
-        for part in msg.walk():
-            content_disposition = part.get('Content-Disposition', '')
-            
-            if 'name="images"' in content_disposition:
-                images_data.append(part.get_payload(decode=True))
-            elif 'name="image_' in content_disposition:
-                # 個別の画像ファイル
-                images_data.append(part.get_payload(decode=True))
-            else:
-                # その他のパラメータ
-                name_match = re.search(r'name="([^"]+)"', content_disposition)
-                if name_match:
-                    param_name = name_match.group(1)
-                    params[param_name] = part.get_payload(decode=True).decode('utf-8')
+    for param_name, payload in _iter_form_fields(body, content_type):
+        if param_name == b'images' or param_name.startswith(b'image_'):
+            # 個別の画像ファイル
+            images_data.append(payload)
+        else:
+            # その他のパラメータ
+            params[param_name.decode('utf-8')] = payload.decode('utf-8')
     
     return images_data, params
 
@@ -282,30 +342,44 @@ def save_scan_result(result: Dict[str, Any], provider: str, parsed_data: Dict[st
     スキャン結果をDynamoDBに保存
     """
     try:
-        import os
-        import boto3
-        from datetime import datetime
-        
-        table_name = os.environ.get('DYNAMODB_TABLE')
-        if not table_name:
+        if _dynamodb_table is None:
             return
         
-        dynamodb = boto3.resource('dynamodb')
-        table = dynamodb.Table(table_name)
-        
-        item = {
-            'barcode_data': result['data'],
-            'barcode_format': result['format'],
-            'provider': provider,
-            'parsed_data': parsed_data,
-            'confidence': result['confidence'],
-            'engine_used': result['engine'],
-            'created_at': datetime.utcnow().isoformat(),
-            'status': 'scanned'
-        }
+        _dynamodb_table.put_item(Item=_build_scan_item(result, provider, parsed_data))
+        
+    except Exception as e:
+        print(f"Error saving to DynamoDB: {e}")
+        # エラーは記録するが、メイン処理は継続
+
+def save_scan_results(items: List[Dict[str, Any]]):
+    """
+    複数のスキャン結果をDynamoDBに一括保存（最大25件ずつまとめて送信）
+    """
+    try:
+        if _dynamodb_table is None or not items:
+            return
         
-        table.put_item(Item=item)
+        # 同一バーコードが複数含まれる場合は後の結果で上書き
+        with _dynamodb_table.batch_writer(overwrite_by_pkeys=['barcode_data']) as batch:
+            for item in items:
+                batch.put_item(Item=item)
         
     except Exception as e:
         print(f"Error saving to DynamoDB: {e}")
-        # エラーは記録するが、メイン処理は継続 
\ No newline at end of file
+        # エラーは記録するが、メイン処理は継続
+
+def _build_scan_item(result: Dict[str, Any], provider: str, parsed_data: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    DynamoDBに保存するスキャン結果アイテムを生成
+    """
+    return {
+        'barcode_data': result['data'],
+        'barcode_format': result['format'],
+        'provider': provider,
+        'parsed_data': parsed_data,
+        # boto3のDynamoDBシリアライザはfloatを受け付けないためDecimalに変換
+        'confidence': Decimal(str(result['confidence'])),
+        'engine_used': result['engine'],
+        'created_at': datetime.utcnow().isoformat(),
+        'status': 'scanned'
+    } 
\ No newline at end of file
@@ -1,26 +1,81 @@
-import cv2
-import numpy as np
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, TYPE_CHECKING
+import functools
+import os
+from concurrent.futures import ThreadPoolExecutor
 import re
+import string
+import threading
 import time
+from ..utils.constants import PROVIDERS
 
-try:
-    from pyzbar import pyzbar
-    PYZBAR_AVAILABLE = True
-except ImportError:
-    PYZBAR_AVAILABLE = False
+# cv2 / numpy / pyzbar / zxing はコールドスタート短縮のため使用時に読み込む
+if TYPE_CHECKING:
+    import numpy as np
+
+@functools.lru_cache(maxsize=None)
+def _has_pyzbar() -> bool:
+    """
+    PyZBarが利用可能か（初回呼び出し時にのみimportを試行）
+    """
+    try:
+        from pyzbar import pyzbar  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+@functools.lru_cache(maxsize=None)
+def _has_zxing() -> bool:
+    """
+    ZXingが利用可能か（初回呼び出し時にのみimportを試行）
+    """
+    try:
+        import zxing  # noqa: F401
+        return True
+    except ImportError:
+        return False
 
+# RE2が利用可能な場合はDFAベースのエンジンを使用
 try:
-    import zxing
-    ZXING_AVAILABLE = True
+    import re2 as _regex
 except ImportError:
-    ZXING_AVAILABLE = False
+    _regex = re
+
+# 一般的なパターン（数字のみ / アルファベット+数字 / スペース区切り数字 / 英数字+ハイフン）を1つに統合
+_GENERIC_VALIDATE = _regex.compile(
+    r'^(?:\d{6,20}|[A-Z]{2}\d{8,15}|\d{2,3}\s\d{3,15}|[A-Z0-9\-]{6,25})$'
+)
+
+# スキャン用のスレッドプール（Lambdaコンテナ内の呼び出し間で再利用）
+_SCAN_POOL = ThreadPoolExecutor(max_workers=min(4, os.cpu_count() or 1))
+
+# OpenCV検出器はスレッドセーフではないため、プールの各スレッドごとに1度だけ生成して保持
+_CV_DETECTORS = threading.local()
 
 class MultiFormatBarcodeScanner:
     """
     マルチフォーマット対応バーコードスキャナー
     """
     
+    __slots__ = ('engines', 'ml_model')
+    
+    # エンジン重み
+    _ENGINE_WEIGHTS = {'pyzbar': 0.3, 'zxing': 0.25, 'opencv': 0.1}
+    
+    # バリアント重み
+    _VARIANT_WEIGHTS = {'standard': 0.2, 'high_contrast': 0.15, 'edge_enhanced': 0.1}
+    
+    # プロバイダーごとのパターン（constants.PROVIDERS）を1つの選択パターンに統合してコンパイル
+    _PROVIDER_PATTERNS = {
+        provider: _regex.compile('|'.join(f'(?:{p})' for p in info['patterns']))
+        for provider, info in PROVIDERS.items()
+    }
+    
+    # CODE39で表現可能な文字集合（英大文字・数字・空白・記号 -.$/+%）
+    _CODE39_CHARS = frozenset(string.ascii_uppercase + string.digits + string.whitespace + '-.$/+%')
+    
+    # データ品質判定（英大文字・数字・空白のみ）
+    _QUALITY_PATTERN = re.compile(r'^[A-Z0-9\s]+$')
+    
     def __init__(self):
         self.engines = self._init_engines()
         self.ml_model = None  # 必要に応じてML Kitモデルを読み込み
@@ -31,7 +86,7 @@ class MultiFormatBarcodeScanner:
         """
         engines = []
         
-        if PYZBAR_AVAILABLE:
+        if _has_pyzbar():
             engines.append({
                 'name': 'pyzbar',
                 'function': self._scan_with_pyzbar,
@@ -39,7 +94,7 @@ class MultiFormatBarcodeScanner:
                 'formats': ['CODE128', 'CODE39', 'EAN13', 'ITF', 'CODABAR']
             })
         
-        if ZXING_AVAILABLE:
+        if _has_zxing():
             engines.append({
                 'name': 'zxing',
                 'function': self._scan_with_zxing,
@@ -47,12 +102,12 @@ class MultiFormatBarcodeScanner:
                 'formats': ['CODE128', 'CODE39', 'EAN13', 'ITF', 'CODE93']
             })
         
-        # OpenCVカスタム実装
+        # OpenCV組み込み検出器（EAN-8/EAN-13/UPC-A/UPC-Eのみ対応）
         engines.append({
             'name': 'opencv',
             'function': self._scan_with_opencv,
             'priority': 3,
-            'formats': ['CODE128']
+            'formats': ['EAN13']
         })
         
         return sorted(engines, key=lambda x: x['priority'])
@@ -60,59 +115,122 @@ class MultiFormatBarcodeScanner:
     def scan_multiple_variants(self, variants: List[Dict[str, Any]], 
                               provider_hint: Optional[str] = None,
                               format_hint: Optional[str] = None,
-                              enable_ml: bool = True) -> List[Dict[str, Any]]:
+                              enable_ml: bool = True,
+                              early_exit_threshold: float = 0.95,
+                              max_results: Optional[int] = None) -> List[Dict[str, Any]]:
         """
         複数の前処理バリエーションでスキャンを実行
+        
+        信頼度がearly_exit_threshold以上の結果が得られた時点で残りのスキャンを打ち切る。
+        バリエーションは処理の軽い順（standardが先頭）に渡すこと。
+        max_resultsを指定した場合は信頼度上位の結果のみを返す。
         """
-        all_results = []
+        # フォーマットヒントがある場合は対応エンジンのみ実行
+        tasks = [
+            (variant, engine)
+            for variant in variants
+            for engine in self.engines
+            if not (format_hint and format_hint not in engine['formats'])
+        ]
+        
+        # 結果は項目ごとの並列リストで保持し、辞書は返却する分だけ生成する
+        found_data = []
+        found_numeric = []
+        found_engines = []
+        found_variants = []
+        found_confidences = []
+        found_timestamps = []
+        seen = set()
+        found_confident = False
         
-        for variant in variants:
-            image = variant['image']
-            variant_name = variant['name']
+        # 先頭バリエーション（standard）のみを先に実行し、閾値に達しなければ残りを並列実行する
+        # （高信頼度の結果は通常standardで得られるため、不要なスキャンを開始しない）
+        first_variant = variants[0] if variants else None
+        waves = (
+            [task for task in tasks if task[0] is first_variant],
+            [task for task in tasks if task[0] is not first_variant]
+        )
+        
+        for wave in waves:
+            if found_confident or not wave:
+                continue
             
-            for engine in self.engines:
-                # フォーマットヒントがある場合は対応エンジンのみ実行
-                if format_hint and format_hint not in engine['formats']:
-                    continue
+            # pyzbar / OpenCV の処理はGILを解放するため、バリエーション×エンジンをスレッドで並列実行
+            futures = [
+                _SCAN_POOL.submit(engine['function'], variant['image'], format_hint)
+                for variant, engine in wave
+            ]
+            
+            # 結果はバリエーション順に評価する
+            for (variant, engine), future in zip(wave, futures):
+                variant_name = variant['name']
+                # エンジン・バリアント重みは結果ごとではなく組み合わせごとに1回だけ計算
+                base_score = self._base_score(variant_name, engine['name'])
                 
                 try:
-                    results = engine['function'](image, format_hint)
+                    results = future.result()
                     
                     for result in results:
+                        # プロバイダーヒントがある場合、検証済みの結果はパターン一致が確定している
                         if self._validate_result(result, provider_hint):
-                            confidence = self._calculate_confidence(
-                                result, variant_name, engine['name'], provider_hint
+                            # 文字種別の判定は結果ごとに1回だけ行い、以降の判定で再利用
+                            is_numeric = result.isdigit()
+                            confidence = min(
+                                base_score + self._data_bonus(result, bool(provider_hint), is_numeric), 1.0
                             )
                             
-                            all_results.append({
-                                'data': result,
-                                'format': self._detect_format(result),
-                                'engine': engine['name'],
-                                'variant': variant_name,
-                                'confidence': confidence,
-                                'timestamp': time.time()
-                            })
+                            # 重複除去（最初に出現した結果を保持）
+                            if result not in seen:
+                                seen.add(result)
+                                found_data.append(result)
+                                found_numeric.append(is_numeric)
+                                found_engines.append(engine['name'])
+                                found_variants.append(variant_name)
+                                found_confidences.append(confidence)
+                                found_timestamps.append(time.time())
+                            
+                            if confidence >= early_exit_threshold:
+                                found_confident = True
+                                break
                             
                 except Exception as e:
                     print(f"Engine {engine['name']} failed on variant {variant_name}: {e}")
                     continue
+                
+                if found_confident:
+                    # 未着手のスキャンは取り消す（実行中のスキャンの完了は待たない）
+                    for pending in futures:
+                        pending.cancel()
+                    break
         
-        # 重複除去
-        unique_results = self._remove_duplicates(all_results)
+        def build_result(i: int) -> Dict[str, Any]:
+            return {
+                'data': found_data[i],
+                'format': self._detect_format(found_data[i], found_numeric[i]),
+                'engine': found_engines[i],
+                'variant': found_variants[i],
+                'confidence': found_confidences[i],
+                'timestamp': found_timestamps[i]
+            }
         
         # ML による精度向上（有効な場合）
-        if enable_ml and len(unique_results) > 1 and self.ml_model:
-            unique_results = self._apply_ml_ranking(unique_results)
+        if enable_ml and len(found_data) > 1 and self.ml_model:
+            unique_results = self._apply_ml_ranking([build_result(i) for i in range(len(found_data))])
+            return sorted(unique_results, key=lambda x: x['confidence'], reverse=True)[:max_results]
         
-        return sorted(unique_results, key=lambda x: x['confidence'], reverse=True)
+        # 信頼度の配列のみで並べ替え、上位の結果だけ辞書化する
+        order = sorted(range(len(found_data)), key=found_confidences.__getitem__, reverse=True)
+        return [build_result(i) for i in order[:max_results]]
     
-    def _scan_with_pyzbar(self, image: np.ndarray, format_hint: Optional[str] = None) -> List[str]:
+    def _scan_with_pyzbar(self, image: 'np.ndarray', format_hint: Optional[str] = None) -> List[str]:
         """
         PyZBarを使用したスキャン
         """
-        if not PYZBAR_AVAILABLE:
+        if not _has_pyzbar():
             return []
         
+        from pyzbar import pyzbar
+        
         try:
             # 全フォーマットでスキャン
             barcodes = pyzbar.decode(image)
@@ -134,45 +252,42 @@ class MultiFormatBarcodeScanner:
             print(f"PyZBar scan error: {e}")
             return []
     
-    def _scan_with_zxing(self, image: np.ndarray, format_hint: Optional[str] = None) -> List[str]:
+    def _scan_with_zxing(self, image: 'np.ndarray', format_hint: Optional[str] = None) -> List[str]:
         """
         ZXingを使用したスキャン（仮実装）
         """
         # 実際の環境ではzxing-cppまたはpython-zxingを使用
         return []
     
-    def _scan_with_opencv(self, image: np.ndarray, format_hint: Optional[str] = None) -> List[str]:
+    def _scan_with_opencv(self, image: 'np.ndarray', format_hint: Optional[str] = None) -> List[str]:
         """
-        OpenCVカスタム実装（基本的なパターンマッチング）
+        OpenCV組み込みのバーコード検出器（cv2.barcode.BarcodeDetector）を使用したスキャン
         """
         try:
-            # エッジ検出
-            edges = cv2.Canny(image, 50, 150)
+            detector = self._get_cv_detector()
+            ok, decoded_info, _, _ = detector.detectAndDecodeWithType(image)
+            if not ok:
+                return []
             
-            # 水平線検出
-            horizontal_kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (40, 1))
-            horizontal_lines = cv2.morphologyEx(edges, cv2.MORPH_OPEN, horizontal_kernel)
-            
-            # バーコード領域の抽出（簡易版）
-            contours, _ = cv2.findContours(horizontal_lines, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-            
-            results = []
-            for contour in contours:
-                x, y, w, h = cv2.boundingRect(contour)
-                
-                # バーコードらしい領域のみ処理
-                if w > 100 and h > 10 and w/h > 5:
-                    roi = image[y:y+h, x:x+w]
-                    # ここで実際のバーコード解析を実装
-                    # 現在は空の実装
-                    pass
-            
-            return results
+            return [data for data in decoded_info if data]
             
         except Exception as e:
             print(f"OpenCV scan error: {e}")
             return []
     
+    def _get_cv_detector(self) -> Any:
+        """
+        OpenCVバーコード検出器を取得（スレッドごとに1度だけ生成して再利用）
+        """
+        detector = getattr(_CV_DETECTORS, 'barcode', None)
+        if detector is None:
+            import cv2
+            
+            detector = cv2.barcode.BarcodeDetector()
+            _CV_DETECTORS.barcode = detector
+        
+        return detector
+    
     def _validate_result(self, data: str, provider_hint: Optional[str] = None) -> bool:
         """
         スキャン結果の妥当性検証
@@ -189,85 +304,59 @@ class MultiFormatBarcodeScanner:
             return self._validate_provider_pattern(data, provider_hint)
         
         # 一般的なパターンチェック
-        patterns = [
-            r'^\d{6,20}$',           # 数字のみ
-            r'^[A-Z]{2}\d{8,15}$',   # アルファベット+数字
-            r'^\d{2,3}\s\d{3,15}$',  # スペース区切り数字
-            r'^[A-Z0-9\-]{6,25}$'    # 英数字+ハイフン
-        ]
-        
-        return any(re.match(pattern, data) for pattern in patterns)
+        return bool(_GENERIC_VALIDATE.match(data))
     
     def _validate_provider_pattern(self, data: str, provider: str) -> bool:
         """
         プロバイダー固有パターンの検証
         """
-        provider_patterns = {
-            'seven_ticket': [r'^23\d{6}\s\d{8}\s\d{3}$', r'^\d{6}\s\d{8}\s\d{3}$'],
-            'ticket_pia': [r'^64\d{11}$', r'^640032\d{7}$'],
-            'lawson_ticket': [r'^30\d{11}$', r'^L\d{10}$'],
-            'eplus': [r'^EP\d{10}$'],
-            'cnplayguide': [r'^CN\d{10}$']
-        }
-        
-        patterns = provider_patterns.get(provider, [])
-        return any(re.match(pattern, data) for pattern in patterns)
+        pattern = self._PROVIDER_PATTERNS.get(provider)
+        return bool(pattern and pattern.match(data))
     
-    def _detect_format(self, data: str) -> str:
+    def _detect_format(self, data: str, is_numeric: Optional[bool] = None) -> str:
         """
         データからバーコード形式を推定
         """
+        if is_numeric is None:
+            is_numeric = data.isdigit()
+        
         # 長さと文字種別から推定
-        if len(data) == 13 and data.isdigit():
+        if len(data) == 13 and is_numeric:
             return 'EAN13'
-        elif re.match(r'^[A-Z0-9\-\.\s\$\/\+%]+$', data):
+        elif data and self._CODE39_CHARS.issuperset(data):
             if len(data) <= 43:
                 return 'CODE39'
             else:
                 return 'CODE128'
-        elif data.isdigit() and len(data) % 2 == 0:
+        elif is_numeric and len(data) % 2 == 0:
             return 'ITF'
         else:
             return 'CODE128'  # デフォルト
     
-    def _calculate_confidence(self, data: str, variant: str, engine: str, provider_hint: Optional[str] = None) -> float:
+    def _base_score(self, variant: str, engine: str) -> float:
         """
-        信頼度スコアの計算
+        エンジン・バリアント重みによる基本スコア
         """
-        base_score = 0.5
-        
-        # エンジン重み
-        engine_weights = {'pyzbar': 0.3, 'zxing': 0.25, 'opencv': 0.1}
-        base_score += engine_weights.get(engine, 0.1)
-        
-        # バリアント重み
-        variant_weights = {'standard': 0.2, 'high_contrast': 0.15, 'edge_enhanced': 0.1}
-        base_score += variant_weights.get(variant, 0.05)
-        
-        # プロバイダー一致ボーナス
-        if provider_hint and self._validate_provider_pattern(data, provider_hint):
-            base_score += 0.2
-        
-        # データ品質ボーナス
-        if data.isdigit() or re.match(r'^[A-Z0-9\s]+$', data):
-            base_score += 0.1
-        
-        return min(base_score, 1.0)
+        return 0.5 + self._ENGINE_WEIGHTS.get(engine, 0.1) + self._VARIANT_WEIGHTS.get(variant, 0.05)
     
-    def _remove_duplicates(self, results: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    def _data_bonus(self, data: str, provider_matched: bool, is_numeric: Optional[bool] = None) -> float:
         """
-        重複結果の除去
+        プロバイダー一致・データ品質によるボーナス
         """
-        seen = set()
-        unique_results = []
+        bonus = 0.0
+        
+        # プロバイダー一致ボーナス
+        if provider_matched:
+            bonus += 0.2
+        
+        if is_numeric is None:
+            is_numeric = data.isdigit()
         
-        for result in results:
-            data = result['data']
-            if data not in seen:
-                seen.add(data)
-                unique_results.append(result)
+        # データ品質ボーナス
+        if is_numeric or self._QUALITY_PATTERN.match(data):
+            bonus += 0.1
         
-        return unique_results
+        return bonus
     
     def select_best_result(self, results: List[Dict[str, Any]]) -> Dict[str, Any]:
         """
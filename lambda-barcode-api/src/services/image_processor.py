@@ -1,15 +1,36 @@
 import cv2
 import numpy as np
-from PIL import Image, ImageEnhance, ImageFilter
+from PIL import Image
 import io
+import os
+from concurrent.futures import ThreadPoolExecutor
 from typing import List, Dict, Any
 from ..utils.constants import IMAGE_PROCESSING
 
+# バリエーション生成用のスレッドプール（Lambdaコンテナ内の呼び出し間で再利用）
+_VARIANT_POOL = ThreadPoolExecutor(max_workers=min(6, os.cpu_count() or 1))
+
 class ImageProcessor:
     """
     画像の前処理とバリエーション生成を行うクラス
     """
     
+    # 標準以外のバリエーション: (名前, フィルターメソッド名, 説明)
+    _VARIANT_FILTERS = (
+        ('high_contrast', '_enhance_contrast', 'Enhanced contrast for better barcode detection'),
+        ('edge_enhanced', '_enhance_edges', 'Edge enhanced for pattern recognition'),
+        ('noise_reduced', '_reduce_noise', 'Noise reduced for cleaner barcode lines'),
+        ('blur_reduced', '_reduce_blur', 'Blur reduction for sharper barcode edges'),
+        ('binary', '_binarize_image', 'Binary threshold for clear black/white separation')
+    )
+    
+    # エッジ強調カーネル（PILのImageFilter.EDGE_ENHANCE相当、リクエストごとに生成せず共有）
+    _EDGE_ENHANCE_KERNEL = np.array([
+        [-1, -1, -1],
+        [-1, 10, -1],
+        [-1, -1, -1]
+    ], dtype=np.float32) / 2
+    
     def __init__(self):
         self.max_width = IMAGE_PROCESSING['max_width']
         self.max_height = IMAGE_PROCESSING['max_height']
@@ -23,99 +44,75 @@ class ImageProcessor:
             image_data: 元の画像データ（バイト）
         
         Returns:
-            処理済み画像バリエーションのリスト
+            処理済み画像バリエーションのリスト（各variant['image']はH×Wのuint8グレースケール配列）
         """
-        variants = []
-        
         try:
-            # PIL Imageに変換
-            pil_image = Image.open(io.BytesIO(image_data))
-            
-            # リサイズ
-            pil_image = self._resize_image(pil_image)
-            
-            # 標準バリエーション
-            variants.append({
-                'name': 'standard',
-                'image': self._pil_to_cv2(pil_image),
-                'description': 'Original image with basic preprocessing'
-            })
-            
-            # 高コントラストバリエーション
-            high_contrast = self._enhance_contrast(pil_image)
-            variants.append({
-                'name': 'high_contrast',
-                'image': self._pil_to_cv2(high_contrast),
-                'description': 'Enhanced contrast for better barcode detection'
-            })
-            
-            # エッジ強調バリエーション
-            edge_enhanced = self._enhance_edges(pil_image)
-            variants.append({
-                'name': 'edge_enhanced',
-                'image': self._pil_to_cv2(edge_enhanced),
-                'description': 'Edge enhanced for pattern recognition'
-            })
-            
-            # ノイズ除去バリエーション
-            noise_reduced = self._reduce_noise(pil_image)
-            variants.append({
-                'name': 'noise_reduced',
-                'image': self._pil_to_cv2(noise_reduced),
-                'description': 'Noise reduced for cleaner barcode lines'
-            })
-            
-            # ブラー除去バリエーション
-            blur_reduced = self._reduce_blur(pil_image)
-            variants.append({
-                'name': 'blur_reduced',
-                'image': self._pil_to_cv2(blur_reduced),
-                'description': 'Blur reduction for sharper barcode edges'
-            })
-            
-            # グレースケールバリエーション
-            grayscale = self._convert_grayscale(pil_image)
-            variants.append({
-                'name': 'grayscale',
-                'image': self._pil_to_cv2(grayscale),
-                'description': 'Grayscale conversion for monochrome processing'
-            })
+            # グレースケール配列として直接デコードし、リサイズ
+            # （スキャンエンジンはいずれもグレースケール入力を受け付けるため色変換は行わない）
+            gray = self._resize_image(self._decode_image(image_data))
+        except Exception as e:
+            print(f"Error decoding image: {e}")
+            return []
+        
+        # 標準バリエーション（デコード済みの配列をそのまま使うため常に追加される）
+        variants = [{
+            'name': 'standard',
+            'image': gray,
+            'description': 'Original image with basic preprocessing'
+        }]
+        
+        # 残りのバリエーションは共有のグレースケール配列から生成
+        # OpenCVの処理はGILを解放するためスレッドプールで並列実行（入力配列は読み取りのみ）
+        futures = [
+            (name, description, _VARIANT_POOL.submit(getattr(self, filter_name), gray))
+            for name, filter_name, description in self._VARIANT_FILTERS
+        ]
+        
+        # 結果は定義順に追加し、失敗したフィルターのみ読み飛ばす
+        for name, description, future in futures:
+            try:
+                image = future.result()
+            except Exception as e:
+                print(f"Error creating image variant {name}: {e}")
+                continue
             
-            # 二値化バリエーション
-            binary = self._binarize_image(pil_image)
             variants.append({
-                'name': 'binary',
-                'image': self._pil_to_cv2(binary),
-                'description': 'Binary threshold for clear black/white separation'
+                'name': name,
+                'image': image,
+                'description': description
             })
-            
-        except Exception as e:
-            print(f"Error creating image variants: {e}")
-            # エラーが発生した場合は元画像のみを返す
-            try:
-                pil_image = Image.open(io.BytesIO(image_data))
-                pil_image = self._resize_image(pil_image)
-                variants.append({
-                    'name': 'standard',
-                    'image': self._pil_to_cv2(pil_image),
-                    'description': 'Original image (fallback)'
-                })
-            except:
-                pass
         
         return variants
     
-    def _resize_image(self, image: Image.Image) -> Image.Image:
+    def _decode_image(self, image_data: bytes) -> np.ndarray:
+        """
+        画像データをグレースケール配列にデコード
+        
+        Args:
+            image_data: 元の画像データ（バイト）
+        
+        Returns:
+            グレースケール画像配列（H×W, uint8）
+        """
+        image = cv2.imdecode(np.frombuffer(image_data, np.uint8), cv2.IMREAD_GRAYSCALE)
+        
+        # OpenCVでデコードできない形式（GIF等）はPILで読み込む
+        if image is None:
+            image = self._pil_to_cv2(Image.open(io.BytesIO(image_data)))
+        
+        return image
+    
+    def _resize_image(self, image: np.ndarray) -> np.ndarray:
         """
         画像を適切なサイズにリサイズ
         
         Args:
-            image: PIL Image
+            image: OpenCV形式の画像配列
         
         Returns:
-            リサイズされた画像
+            リサイズされた画像配列
         """
-        width, height = image.size
+        height, width = image.shape[:2]
         
         # 最大サイズを超える場合のみリサイズ
         if width > self.max_width or height > self.max_height:
@@ -124,123 +121,96 @@ class ImageProcessor:
             new_width = int(width * ratio)
             new_height = int(height * ratio)
             
-            image = image.resize((new_width, new_height), Image.Resampling.LANCZOS)
+            # 縮小にはINTER_AREA（SIMD最適化済み）を使用
+            image = cv2.resize(image, (new_width, new_height), interpolation=cv2.INTER_AREA)
         
         return image
     
-    def _enhance_contrast(self, image: Image.Image) -> Image.Image:
+    def _enhance_contrast(self, gray: np.ndarray) -> np.ndarray:
         """
         コントラストを強調
         
         Args:
-            image: PIL Image
+            gray: グレースケール画像配列
         
         Returns:
-            コントラスト強調された画像
+            コントラスト強調された画像配列
         """
-        enhancer = ImageEnhance.Contrast(image)
-        return enhancer.enhance(2.0)  # コントラストを2倍に
+        # 平均輝度を中心にコントラストを2倍に（PILのImageEnhance.Contrast相当）
+        mean = float(gray.mean())
+        return cv2.addWeighted(gray, 2.0, gray, 0.0, -mean)
     
-    def _enhance_edges(self, image: Image.Image) -> Image.Image:
+    def _enhance_edges(self, gray: np.ndarray) -> np.ndarray:
         """
         エッジを強調
         
         Args:
-            image: PIL Image
+            gray: グレースケール画像配列
         
         Returns:
-            エッジ強調された画像
+            エッジ強調された画像配列
         """
-        # エッジ検出フィルターを適用
-        edge_enhanced = image.filter(ImageFilter.EDGE_ENHANCE)
-        return edge_enhanced
+        # エッジ強調カーネルを適用
+        return cv2.filter2D(gray, -1, self._EDGE_ENHANCE_KERNEL)
     
-    def _reduce_noise(self, image: Image.Image) -> Image.Image:
+    def _reduce_noise(self, gray: np.ndarray) -> np.ndarray:
         """
         ノイズを除去
         
         Args:
-            image: PIL Image
+            gray: グレースケール画像配列
         
         Returns:
-            ノイズ除去された画像
+            ノイズ除去された画像配列
         """
         # メディアンフィルターでノイズ除去
-        denoised = image.filter(ImageFilter.MedianFilter(size=3))
-        return denoised
+        return cv2.medianBlur(gray, 3)
     
-    def _reduce_blur(self, image: Image.Image) -> Image.Image:
+    def _reduce_blur(self, gray: np.ndarray) -> np.ndarray:
         """
         ブラーを軽減
         
         Args:
-            image: PIL Image
-        
-        Returns:
-            ブラー軽減された画像
-        """
-        # アンシャープマスクフィルターを適用
-        sharpened = image.filter(ImageFilter.UnsharpMask(radius=2, percent=150, threshold=3))
-        return sharpened
-    
-    def _convert_grayscale(self, image: Image.Image) -> Image.Image:
-        """
-        グレースケールに変換
-        
-        Args:
-            image: PIL Image
+            gray: グレースケール画像配列
         
         Returns:
-            グレースケール画像
+            ブラー軽減された画像配列
         """
-        if image.mode != 'L':
-            return image.convert('L')
-        return image
+        # アンシャープマスク（半径2、強度150%）
+        blurred = cv2.GaussianBlur(gray, (0, 0), 2)
+        return cv2.addWeighted(gray, 2.5, blurred, -1.5, 0)
     
-    def _binarize_image(self, image: Image.Image) -> Image.Image:
+    def _binarize_image(self, gray: np.ndarray) -> np.ndarray:
         """
         画像を二値化
         
         Args:
-            image: PIL Image
+            gray: グレースケール画像配列
         
         Returns:
-            二値化された画像
+            二値化された画像配列
         """
-        # グレースケールに変換
-        gray = self._convert_grayscale(image)
-        
-        # 適応的閾値処理
-        gray_array = np.array(gray)
-        
         # OpenCVの適応的閾値処理を使用
-        binary = cv2.adaptiveThreshold(
-            gray_array, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY, 11, 2
+        return cv2.adaptiveThreshold(
+            gray, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY, 11, 2
         )
-        
-        return Image.fromarray(binary)
     
     def _pil_to_cv2(self, pil_image: Image.Image) -> np.ndarray:
         """
-        PIL ImageをOpenCV形式（numpy配列）に変換
+        PIL ImageをOpenCV形式（グレースケールのnumpy配列）に変換
         
         Args:
             pil_image: PIL Image
         
         Returns:
-            OpenCV形式の画像配列
+            グレースケール画像配列（H×W, uint8）
         """
-        # RGBに変換（OpenCVはBGR形式）
-        if pil_image.mode != 'RGB':
-            pil_image = pil_image.convert('RGB')
+        # グレースケールに変換（チャンネル順の変換は不要）
+        if pil_image.mode != 'L':
+            pil_image = pil_image.convert('L')
         
         # numpy配列に変換
-        cv2_image = np.array(pil_image)
-        
-        # BGRに変換（OpenCVの標準形式）
-        cv2_image = cv2.cvtColor(cv2_image, cv2.COLOR_RGB2BGR)
-        
-        return cv2_image
+        return np.array(pil_image)
     
     def cv2_to_pil(self, cv2_image: np.ndarray) -> Image.Image:
         """
@@ -252,6 +222,10 @@ class ImageProcessor:
         Returns:
             PIL Image
         """
+        # グレースケール（2次元配列）はそのまま変換
+        if cv2_image.ndim == 2:
+            return Image.fromarray(cv2_image, mode='L')
+        
         # BGRからRGBに変換
         rgb_image = cv2.cvtColor(cv2_image, cv2.COLOR_BGR2RGB)
         
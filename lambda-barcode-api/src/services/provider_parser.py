@@ -2,6 +2,42 @@ import re
 from typing import Dict, Any, Optional
 from ..utils.constants import PROVIDERS
 
+# パターン先頭のリテラル接頭辞（例: '^64\d{11}$' -> '64'）
+_LITERAL_PREFIX_RE = re.compile(r'\^([A-Za-z0-9]+)')
+
+def _build_prefix_table(providers: Dict[str, Any]) -> Dict[str, str]:
+    """
+    パターン先頭のリテラル接頭辞からプロバイダーIDを引く表を生成
+    """
+    table = {}
+    for pid, info in providers.items():
+        for pattern in info['patterns']:
+            prefix_match = _LITERAL_PREFIX_RE.match(pattern)
+            if prefix_match:
+                table.setdefault(prefix_match.group(1), pid)
+    return table
+
+PROVIDER_PREFIXES = _build_prefix_table(PROVIDERS)
+
+# 長い接頭辞から順に照合する
+PROVIDER_PREFIX_LENGTHS = sorted({len(prefix) for prefix in PROVIDER_PREFIXES}, reverse=True)
+
+def _build_fallback_providers(providers: Dict[str, Any], prefix_table: Dict[str, str]) -> tuple:
+    """
+    接頭辞表で引けないパターンを持つプロバイダーIDを列挙
+    （リテラル接頭辞がない、または接頭辞が他プロバイダーと重複しているもの）
+    """
+    fallbacks = []
+    for pid, info in providers.items():
+        for pattern in info['patterns']:
+            prefix_match = _LITERAL_PREFIX_RE.match(pattern)
+            if not prefix_match or prefix_table[prefix_match.group(1)] != pid:
+                fallbacks.append(pid)
+                break
+    return tuple(fallbacks)
+
+PROVIDER_FALLBACKS = _build_fallback_providers(PROVIDERS, PROVIDER_PREFIXES)
+
 class ProviderParser:
     """
     チケットプロバイダー固有のデータ解析を行うクラス
@@ -9,6 +45,9 @@ class ProviderParser:
     
     def __init__(self):
         self.providers = PROVIDERS
+        self._prefix_table = PROVIDER_PREFIXES
+        self._prefix_lengths = PROVIDER_PREFIX_LENGTHS
+        self._fallback_providers = PROVIDER_FALLBACKS
     
     def detect_provider(self, barcode_data: str) -> Optional[str]:
         """
@@ -23,16 +62,25 @@ class ProviderParser:
         if not barcode_data:
             return None
         
-        # 各プロバイダーのパターンでマッチング
-        for provider_id, provider_info in self.providers.items():
-            patterns = provider_info['patterns']
-            
-            for pattern in patterns:
-                if re.match(pattern, barcode_data):
-                    return provider_id
+        # 接頭辞テーブルで候補を絞り込み、コンパイル済みパターンで確認
+        for length in self._prefix_lengths:
+            provider_id = self._prefix_table.get(barcode_data[:length])
+            if provider_id and self._matches_provider(barcode_data, provider_id):
+                return provider_id
+        
+        # 接頭辞表で引けないパターン（例: セブンチケットの数字のみ形式）を持つプロバイダーのみ照合
+        for provider_id in self._fallback_providers:
+            if self._matches_provider(barcode_data, provider_id):
+                return provider_id
         
         return None
     
+    def _matches_provider(self, barcode_data: str, provider_id: str) -> bool:
+        """
+        バーコードデータがプロバイダーのいずれかのパターンに一致するか
+        """
+        return self.providers[provider_id]['compiled'].fullmatch(barcode_data) is not None
+    
     def parse(self, barcode_data: str, provider: Optional[str] = None) -> Dict[str, Any]:
         """
         バーコードデータを解析して構造化データを生成
@@ -172,14 +220,18 @@ class ProviderParser:
             'raw_data': data
         }
         
-        # 基本的な情報を抽出
+        # 基本的な情報を抽出（各判定は1回だけ行う）
+        is_numeric = data.isdigit()
+        has_spaces = ' ' in data
+        
         parsed['length'] = len(data)
-        parsed['is_numeric'] = data.isdigit()
-        parsed['has_spaces'] = ' ' in data
-        parsed['has_letters'] = any(c.isalpha() for c in data)
+        parsed['is_numeric'] = is_numeric
+        parsed['has_spaces'] = has_spaces
+        # 数字のみの場合は文字の走査を省略
+        parsed['has_letters'] = not is_numeric and any(c.isalpha() for c in data)
         
         # スペースで分割された場合
-        if ' ' in data:
+        if has_spaces:
             parts = data.split()
             parsed['parts'] = parts
             parsed['part_count'] = len(parts)
@@ -206,13 +258,12 @@ class ProviderParser:
         provider_info = self.providers[provider]
         patterns = provider_info['patterns']
         
-        for pattern in patterns:
-            if re.match(pattern, data):
-                return {
-                    'valid': True,
-                    'provider': provider,
-                    'provider_name': provider_info['name']
-                }
+        if provider_info['compiled'].fullmatch(data):
+            return {
+                'valid': True,
+                'provider': provider,
+                'provider_name': provider_info['name']
+            }
         
         return {
             'valid': False,
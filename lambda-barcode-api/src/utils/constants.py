@@ -1,12 +1,17 @@
+import re
+
 # バーコード形式
-SUPPORTED_FORMATS = [
+_SUPPORTED_FORMAT_LIST = (
     'CODE128',
     'CODE39', 
     'EAN13',
     'ITF',
     'CODABAR',
     'CODE93'
-]
+)
+SUPPORTED_FORMATS = frozenset(_SUPPORTED_FORMAT_LIST)
+# エラーメッセージ用（定義順を保持）
+SUPPORTED_FORMATS_DISPLAY = ', '.join(_SUPPORTED_FORMAT_LIST)
 
 # チケットプロバイダー
 PROVIDERS = {
@@ -45,10 +50,22 @@ PROVIDERS = {
     }
 }
 
+# 各プロバイダーのパターンを1つの選択パターンにまとめ、モジュール読み込み時にコンパイル
+for _provider in PROVIDERS.values():
+    _provider['compiled'] = re.compile('|'.join(f'(?:{p})' for p in _provider['patterns']))
+
 # ファイル制限
 MAX_FILE_SIZE = 10 * 1024 * 1024  # 10MB
 SUPPORTED_IMAGE_TYPES = ['image/jpeg', 'image/png', 'image/gif']
 
+# JPEG, PNG, GIFのマジックナンバー
+IMAGE_SIGNATURES = (
+    b'\xff\xd8\xff',          # image/jpeg
+    b'\x89PNG\r\n\x1a\n',     # image/png
+    b'GIF87a',                # image/gif
+    b'GIF89a'                 # image/gif
+)
+
 # 画像処理設定
 IMAGE_PROCESSING = {
     'max_width': 1920,
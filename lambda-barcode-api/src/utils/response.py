@@ -1,7 +1,44 @@
 import json
+from functools import partial
 from typing import Dict, Any, Optional
 from .constants import CORS_HEADERS, HTTP_STATUS
 
+# レスポンスヘッダーとエンコーダーはモジュール読み込み時に1回だけ生成
+# ヘッダー辞書は全レスポンスで共有するため変更しないこと
+# （Lambdaランタイムがjsonでシリアライズするため、MappingProxyTypeではなく通常のdictとする）
+_HEADERS_CORS = {**CORS_HEADERS, 'Content-Type': 'application/json'}
+_HEADERS_NOCORS = {'Content-Type': 'application/json'}
+
+# orjsonが利用可能な場合は高速なエンコーダーを使用（ハンドラーからも共通で利用する）
+try:
+    import orjson
+
+    _ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+
+    def json_dumps(body: Any) -> str:
+        return orjson.dumps(body, default=str, option=_ORJSON_OPTIONS).decode('utf-8')
+except ImportError:
+    json_dumps = partial(json.dumps, ensure_ascii=False, default=str)
+
+def _mk(status_code: int, body: Any, headers: Dict[str, str]) -> Dict[str, Any]:
+    return {
+        'statusCode': status_code,
+        'headers': headers,
+        'body': json_dumps(body)
+    }
+
+def create_response_cors(status_code: int, body: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    CORSヘッダー付きのAPIレスポンスを生成
+    """
+    return _mk(status_code, body, _HEADERS_CORS)
+
+def create_response_nocors(status_code: int, body: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    CORSヘッダーなしのAPIレスポンスを生成
+    """
+    return _mk(status_code, body, _HEADERS_NOCORS)
+
 def create_response(status_code: int, body: Dict[str, Any], cors: bool = True) -> Dict[str, Any]:
     """
     標準的なAPIレスポンスを生成
@@ -14,18 +51,7 @@ def create_response(status_code: int, body: Dict[str, Any], cors: bool = True) -
     Returns:
         API Gateway形式のレスポンス
     """
-    headers = {}
-    
-    if cors:
-        headers.update(CORS_HEADERS)
-    
-    headers['Content-Type'] = 'application/json'
-    
-    return {
-        'statusCode': status_code,
-        'headers': headers,
-        'body': json.dumps(body, ensure_ascii=False, default=str)
-    }
+    return _mk(status_code, body, _HEADERS_CORS if cors else _HEADERS_NOCORS)
 
 def create_error_response(status_code: int, message: str, 
                          error_code: Optional[str] = None, 
@@ -1,7 +1,29 @@
 import re
 import mimetypes
 from typing import Optional, Dict, Any
-from .constants import MAX_FILE_SIZE, SUPPORTED_IMAGE_TYPES, PROVIDERS, SUPPORTED_FORMATS
+from .constants import MAX_FILE_SIZE, SUPPORTED_IMAGE_TYPES, PROVIDERS, SUPPORTED_FORMATS, SUPPORTED_FORMATS_DISPLAY, IMAGE_SIGNATURES
+
+# 正規表現はモジュール読み込み時にコンパイル
+_WS_RE = re.compile(r'\s+')
+
+class _NonPrintableTable(dict):
+    """
+    str.translate用の変換表（印刷不可の文字を削除）
+
+    コードポイントごとの判定は初回のみ行い、以降は辞書から引く
+    """
+    
+    def __missing__(self, cp: int) -> Optional[int]:
+        value = None if not chr(cp).isprintable() else cp
+        self[cp] = value
+        return value
+
+_NON_PRINTABLE_TABLE = _NonPrintableTable()
+# 画像バリデーションのエラーメッセージ（validate_image_fileとvalidate_batch_requestで共通）
+_ERR_NO_IMAGE = "No image data provided"
+_ERR_FILE_SIZE = "File size exceeds maximum limit of {}MB"
+_ERR_TOO_SMALL = "Invalid image file - too small"
+_ERR_UNSUPPORTED_IMAGE = "Unsupported image format. Please use JPEG, PNG, or GIF"
 
 def validate_image_file(image_data: bytes, max_size: int = MAX_FILE_SIZE) -> Optional[str]:
     """
@@ -15,31 +37,18 @@ def validate_image_file(image_data: bytes, max_size: int = MAX_FILE_SIZE) -> Opt
         エラーメッセージ（バリデーション成功時はNone）
     """
     if not image_data:
-        return "No image data provided"
+        return _ERR_NO_IMAGE
     
     if len(image_data) > max_size:
-        return f"File size exceeds maximum limit of {max_size // (1024*1024)}MB"
+        return _ERR_FILE_SIZE.format(max_size // (1024*1024))
     
     # 画像形式の検証（簡易版）
     if len(image_data) < 10:
-        return "Invalid image file - too small"
+        return _ERR_TOO_SMALL
     
     # JPEG, PNG, GIFのマジックナンバーをチェック
-    magic_numbers = {
-        b'\xff\xd8\xff': 'image/jpeg',
-        b'\x89PNG\r\n\x1a\n': 'image/png',
-        b'GIF87a': 'image/gif',
-        b'GIF89a': 'image/gif'
-    }
-    
-    is_valid_image = False
-    for magic, mime_type in magic_numbers.items():
-        if image_data.startswith(magic):
-            is_valid_image = True
-            break
-    
-    if not is_valid_image:
-        return "Unsupported image format. Please use JPEG, PNG, or GIF"
+    if not image_data.startswith(IMAGE_SIGNATURES):
+        return _ERR_UNSUPPORTED_IMAGE
     
     return None
 
@@ -82,7 +91,7 @@ def validate_format(format_name: str) -> Optional[str]:
         return None  # 形式指定はオプション
     
     if format_name not in SUPPORTED_FORMATS:
-        return f"Unsupported format: {format_name}. Supported formats: {', '.join(SUPPORTED_FORMATS)}"
+        return f"Unsupported format: {format_name}. Supported formats: {SUPPORTED_FORMATS_DISPLAY}"
     
     return None
 
@@ -173,11 +182,21 @@ def validate_batch_request(images_data: list, max_images: int = 10) -> Optional[
     if len(images_data) > max_images:
         return f"Too many images. Maximum allowed: {max_images}"
     
-    # 各画像のバリデーション
+    # 内容を見る前に空データとサイズだけを確認し、サイズ超過のバッチを早期に拒否
     for i, image_data in enumerate(images_data):
-        error = validate_image_file(image_data)
-        if error:
-            return f"Image {i+1}: {error}"
+        if not image_data:
+            return f"Image {i+1}: {_ERR_NO_IMAGE}"
+        
+        if len(image_data) > MAX_FILE_SIZE:
+            return f"Image {i+1}: {_ERR_FILE_SIZE.format(MAX_FILE_SIZE // (1024*1024))}"
+    
+    # 各画像の内容のバリデーション（validate_image_fileと同じ判定をインライン化）
+    for i, image_data in enumerate(images_data):
+        if len(image_data) < 10:
+            return f"Image {i+1}: {_ERR_TOO_SMALL}"
+        
+        if not image_data.startswith(IMAGE_SIGNATURES):
+            return f"Image {i+1}: {_ERR_UNSUPPORTED_IMAGE}"
     
     return None
 
@@ -194,16 +213,8 @@ def sanitize_barcode_data(data: str) -> str:
     if not data:
         return ""
     
-    # 前後の空白を削除
-    data = data.strip()
-    
-    # 制御文字を削除
-    data = ''.join(char for char in data if char.isprintable())
-    
-    # 連続する空白を単一の空白に置換
-    data = re.sub(r'\s+', ' ', data)
-    
-    return data
+    # 前後の空白を削除し、印刷不可の文字を削除した上で、連続する空白を単一の空白に置換
+    return _WS_RE.sub(' ', data.strip().translate(_NON_PRINTABLE_TABLE))
 
 def extract_boundary(content_type: str) -> Optional[str]:
     """
@@ -215,11 +226,10 @@ def extract_boundary(content_type: str) -> Optional[str]:
     Returns:
         boundary文字列（見つからない場合はNone）
     """
-    if 'boundary=' not in content_type:
+    _, found, after = content_type.partition('boundary=')
+    if not found:
         return None
     
-    boundary_match = re.search(r'boundary=([^;]+)', content_type)
-    if boundary_match:
-        return boundary_match.group(1).strip('"')
-    
-    return None 
\ No newline at end of file
+    # 後続のパラメータを除き、RFC 2046の引用符付き形式にも対応
+    boundary = after.split(';', 1)[0].strip().strip('"')
+    return boundary or None 
\ No newline at end of file